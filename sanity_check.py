@@ -5,7 +5,6 @@ Final sanity check script for the reorganized knowledge base.
 import sys
 sys.path.insert(0, "src")
 
-from collections import Counter
 from ingestion import DocumentIngestion
 from retrieval import PrioritizedRetriever, GROUP_PRIORITY_BONUS
 
@@ -24,12 +23,8 @@ def main():
     print(f"Data dir: {stats['data_directory']}")
     print(f"DB path: {stats['db_path']}")
     
-    # Get source_group distribution
-    all_docs = ing.collection.get(include=["metadatas"])
-    sg_counts = Counter()
-    for meta in all_docs["metadatas"]:
-        sg = meta.get("source_group", "unknown")
-        sg_counts[sg] += 1
+    # Get source_group distribution (GROUP BY in Chroma's SQLite)
+    sg_counts = ing.source_group_counts()
     
     print(f"\nSOURCE_GROUP DISTRIBUTION:")
     for sg, count in sorted(sg_counts.items(), key=lambda x: -x[1]):
@@ -4,16 +4,131 @@ Verantwoordelijk voor het inlezen, chunken en indexeren van documenten.
 """
 
 import os
+import bisect
+import functools
 import hashlib
+import queue
 import re
+import threading
+import uuid
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
 from pathlib import Path
-from typing import List, Dict, Optional
-import chromadb  # type: ignore
-from chromadb.config import Settings  # type: ignore
-from chromadb.utils import embedding_functions  # type: ignore
+from typing import TYPE_CHECKING, Deque, List, Dict, Iterator, Optional, Tuple
+import numpy as np  # type: ignore
 from langchain_text_splitters import RecursiveCharacterTextSplitter  # type: ignore
 from pypdf import PdfReader  # type: ignore
 
+# chromadb and sentence_transformers (torch) are imported where they are used:
+# ingest worker processes import this module only to read and chunk files
+if TYPE_CHECKING:
+    from sentence_transformers import SentenceTransformer  # type: ignore
+
+# PyMuPDF is much faster than pypdf for text extraction; optional, pypdf is the fallback
+try:
+    import fitz  # type: ignore
+except ImportError:
+    fitz = None
+
+
+# File types picked up by ingest_directory
+SUPPORTED_EXTENSIONS = {'.md', '.txt', '.pdf'}
+
+# Processing order in ingest_directory: PDFs, markdown, then text files
+EXT_RANK = {'.pdf': 0, '.md': 1, '.txt': 2}
+
+# Number of chunks buffered across files before a single collection.add call
+INGEST_BATCH_SIZE = int(os.environ.get("INGEST_BATCH_SIZE", "200"))
+
+# Worker processes for reading/chunking files (1 = sequential)
+INGEST_WORKERS = int(os.environ.get("INGEST_WORKERS", str(os.cpu_count() or 1)))
+
+# Embedding model and batched encode settings (embeddings are computed outside Chroma)
+EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+EMBED_BATCH_SIZE = int(os.environ.get("EMBED_BATCH_SIZE", "256"))
+EMBED_PRECISION = os.environ.get("EMBED_PRECISION", "auto").lower()
+
+# Max IDs per collection.get call (SQLite bound-variable limit is 999)
+GET_BATCH_SIZE = 900
+
+# Number of query embeddings kept in the per-instance LRU cache
+QUERY_CACHE_SIZE = int(os.environ.get("QUERY_CACHE_SIZE", "256"))
+
+# File next to the database whose content changes on every write; readers in other
+# processes (e.g. the interactive RAG session) use it to invalidate their caches
+KB_VERSION_FILE = "kb_version"
+
+
+def _default_device() -> str:
+    """Use CUDA when available, otherwise CPU. Override with EMBED_DEVICE."""
+    env_device = os.environ.get("EMBED_DEVICE")
+    if env_device:
+        return env_device
+    try:
+        import torch  # type: ignore
+        return "cuda" if torch.cuda.is_available() else "cpu"
+    except ImportError:
+        return "cpu"
+
+
+# Models are loaded once per process and shared by all DocumentIngestion instances
+@functools.lru_cache(maxsize=None)
+def _get_encoder(model_name: str, device: str) -> "SentenceTransformer":
+    """
+    Load (once) the SentenceTransformer used for batched embedding.
+    EMBED_PRECISION: "auto" (FP16 on CUDA, FP32 on CPU), "fp32", or "int8"
+    (dynamic int8 quantization of Linear layers, CPU only).
+    """
+    from sentence_transformers import SentenceTransformer  # type: ignore
+    
+    model = SentenceTransformer(model_name, device=device)
+    if EMBED_PRECISION == "auto" and device.startswith("cuda"):
+        model.half()
+    elif EMBED_PRECISION == "int8" and device == "cpu":
+        import torch  # type: ignore
+        model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    return model
+
+
+@functools.lru_cache(maxsize=None)
+def _get_embedding_function(model_name: str, device: str):
+    """
+    Create (once) the embedding function attached to the collection.
+    Ingestion and queries pass precomputed embeddings, so this only serves callers
+    that hand Chroma raw texts; it wraps the shared _get_encoder model instead of
+    loading a second copy.
+    """
+    from chromadb import EmbeddingFunction  # type: ignore
+    
+    class SharedEncoderEmbeddingFunction(EmbeddingFunction):
+        def __call__(self, input: List[str]) -> List[List[float]]:
+            return _get_encoder(model_name, device).encode(
+                list(input),
+                batch_size=EMBED_BATCH_SIZE,
+                show_progress_bar=False,
+                convert_to_numpy=True,
+                normalize_embeddings=True,
+            ).tolist()
+    
+    return SharedEncoderEmbeddingFunction()
+
+
+# Collection metadata incl. HNSW index parameters (only applied when the collection is created).
+# Space stays "l2": embeddings are normalized, so l2 ranks exactly like cosine and the
+# distance-based thresholds in retrieval keep their meaning.
+COLLECTION_METADATA = {
+    "description": "Local knowledge base documents",
+    "hnsw:space": "l2",
+    "hnsw:M": 16,
+    "hnsw:construction_ef": 100,
+    "hnsw:search_ef": 64,
+    "hnsw:batch_size": 1000,       # keep more additions in the in-memory buffer
+    "hnsw:sync_threshold": 10000,  # persist the index less often during bulk ingest
+}
+
+# Markdown h1-h3 headings, used for per-chunk heading context.
+# [ \t]+ (not \s+) so a lone "#" line never swallows the next line as its title.
+HEADING_PATTERN = re.compile(r'^(#{1,3})[ \t]+(.+?)[ \t]*$', re.MULTILINE)
 
 # Mapping: top-level folder (lowercase) -> source_group
 SOURCE_GROUP_MAP = {
@@ -34,71 +149,27 @@ SOURCE_GROUP_MAP = {
 }
 
 
-class DocumentIngestion:
-    """Handles document ingestion into ChromaDB."""
+class DocumentPreparer:
+    """
+    Reads and chunks documents without touching the database.
+    Kept free of Chroma/model state so it can run inside worker processes.
+    """
     
-    def __init__(self, data_dir: str = None, db_path: str = "./chroma_db"):
+    def __init__(self, data_dir: str = None):
         # Default data dir -> C:\Notes
         if data_dir is None:
             data_dir = r"C:\Notes"
         
         self.data_dir = Path(data_dir).resolve()
         
-        # DB-path remains in home (~/.local-mcp-kb/chroma_db) as before
-        if db_path == "./chroma_db":
-            self.db_path = Path.home() / ".local-mcp-kb" / "chroma_db"
-        else:
-            self.db_path = Path(db_path).resolve()
-        
-        # Make sure the directory exists and is writable
-        self.db_path.mkdir(parents=True, exist_ok=True)
-        
-        self.client = chromadb.PersistentClient(
-            path=str(self.db_path),
-            settings=Settings(
-                anonymized_telemetry=False,
-                allow_reset=True,
-                is_persistent=True
-            )
-        )
-        
-        # Use Chroma's built-in SentenceTransformer embedding function
-        self.embedding_function = embedding_functions.SentenceTransformerEmbeddingFunction(
-            model_name="all-MiniLM-L6-v2",
-            device="cpu",
-        )
-        
-        # Get or create collection with embedding function
-        # If collection exists with different embedding function, delete and recreate
-        try:
-            self.collection = self.client.get_or_create_collection(
-                name="knowledge_base",
-                metadata={"description": "Local knowledge base documents"},
-                embedding_function=self.embedding_function
-            )
-        except ValueError as e:
-            if "embedding function conflict" in str(e).lower():
-                print("⚠ Resetting collection to use new embedding function...")
-                self.client.delete_collection("knowledge_base")
-                self.collection = self.client.create_collection(
-                    name="knowledge_base",
-                    metadata={"description": "Local knowledge base documents"},
-                    embedding_function=self.embedding_function
-                )
-            else:
-                raise
-        
         # Initialize text splitter
+        # add_start_index makes the splitter report each chunk's offset in the source text
         self.text_splitter = RecursiveCharacterTextSplitter(
             chunk_size=1000,
             chunk_overlap=200,
             length_function=len,
+            add_start_index=True,
         )
-        
-        print(f"✓ DocumentIngestion initialized")
-        print(f"  - Data directory: {self.data_dir}")
-        print(f"  - Database path: {self.db_path}")
-        print(f"  - Current documents: {self.collection.count()}")
     
     def _doc_key(self, file_path: Path) -> str:
         """Generate a document key from file path relative to data directory."""
@@ -108,6 +179,15 @@ class DocumentIngestion:
             rel = str(file_path)
         return rel
 
+    @staticmethod
+    def _file_sig(file_path: Path) -> Optional[str]:
+        """Cheap change signature from stat (mtime_ns:size); None if the file cannot be stat'ed."""
+        try:
+            st = file_path.stat()
+        except OSError:
+            return None
+        return f"{st.st_mtime_ns}:{st.st_size}"
+
     def _get_source_group(self, relative_path: Path) -> str:
         """
         Determine source_group from the top-level folder of relative_path.
@@ -120,10 +200,60 @@ class DocumentIngestion:
         top_folder = parts[0].lower()
         return SOURCE_GROUP_MAP.get(top_folder, "misc")
 
-    def _chunk_id(self, doc_key: str, chunk_index: int) -> str:
-        """Generate a unique chunk ID from document key and chunk index."""
-        h = hashlib.sha1(doc_key.encode("utf-8")).hexdigest()[:12]
-        return f"{h}_{chunk_index:04d}"
+    def read_pdf(self, file_path: Path) -> Optional[Tuple[str, List[int], List[int]]]:
+        """
+        Read a PDF using PyMuPDF (native C parser), falling back to pypdf when PyMuPDF
+        is not installed or fails on this file.
+        Returns (text, page_starts, page_numbers): the joined text plus the char offset
+        and 1-based page number of every non-empty page, or None if there is no text.
+        """
+        def extract(use_fitz: bool) -> Tuple[int, str, List[int], List[int]]:
+            # Collect page texts and join once (avoids quadratic string concatenation)
+            page_texts = []
+            page_starts = []
+            page_numbers = []
+            offset = 0
+            
+            def add_page(page_no: int, page_text: str) -> None:
+                nonlocal offset
+                if page_text:
+                    page_starts.append(offset)
+                    page_numbers.append(page_no)
+                    page_texts.append(page_text + "\n")
+                    offset += len(page_text) + 1
+            
+            if use_fitz:
+                with fitz.open(str(file_path)) as doc:
+                    page_count = doc.page_count
+                    for page_no, page in enumerate(doc, start=1):
+                        add_page(page_no, page.get_text("text"))
+            else:
+                reader = PdfReader(str(file_path))
+                page_count = len(reader.pages)
+                for page_no, page in enumerate(reader.pages, start=1):
+                    add_page(page_no, page.extract_text())
+            return page_count, "".join(page_texts), page_starts, page_numbers
+        
+        try:
+            extracted = None
+            if fitz is not None:
+                try:
+                    extracted = extract(use_fitz=True)
+                except Exception as fitz_error:
+                    print(f"  ⚠ PyMuPDF could not read PDF ({fitz_error}), retrying with pypdf")
+            if extracted is None:
+                extracted = extract(use_fitz=False)
+            page_count, text, page_starts, page_numbers = extracted
+            
+            if text.strip():
+                print(f"  ✓ Extracted {page_count} pages from PDF")
+                return text, page_starts, page_numbers
+            else:
+                print(f"  ⚠ No text found in PDF")
+                return None
+        except Exception as pdf_error:
+            print(f"  ✗ Error reading PDF: {pdf_error}")
+            return None
     
     def read_file(self, file_path: Path) -> Optional[str]:
         """Read file content based on extension."""
@@ -132,24 +262,8 @@ class DocumentIngestion:
                 with open(file_path, 'r', encoding='utf-8') as f:
                     return f.read()
             elif file_path.suffix == '.pdf':
-                # Read PDF using pypdf
-                try:
-                    reader = PdfReader(str(file_path))
-                    text = ""
-                    for page in reader.pages:
-                        page_text = page.extract_text()
-                        if page_text:
-                            text += page_text + "\n"
-                    
-                    if text.strip():
-                        print(f"  ✓ Extracted {len(reader.pages)} pages from PDF")
-                        return text
-                    else:
-                        print(f"  ⚠ No text found in PDF")
-                        return None
-                except Exception as pdf_error:
-                    print(f"  ✗ Error reading PDF: {pdf_error}")
-                    return None
+                pdf = self.read_pdf(file_path)
+                return pdf[0] if pdf else None
             else:
                 print(f"⚠ Unsupported file type: {file_path.suffix}")
                 return None
@@ -157,81 +271,134 @@ class DocumentIngestion:
             print(f"✗ Error reading {file_path.name}: {e}")
             return None
     
-    def extract_heading_context(self, text: str, chunk_start: int) -> Dict[str, str]:
-        """Extract heading context (h1, h2, h3) for a chunk position in markdown text."""
-        headings = {"h1": "", "h2": "", "h3": "", "title": ""}
+    def build_heading_index(self, text: str) -> Tuple[List[int], List[Tuple[str, str, str]], Tuple[int, str]]:
+        """
+        Scan a markdown document once and index its headings.
         
-        # Find all markdown headings before the chunk position
-        heading_pattern = r'^(#{1,3})\s+(.+)$'
+        Returns (offsets, states, first_h1):
+            - offsets: sorted start offsets of all h1-h3 headings
+            - states: (h1, h2, h3) in effect right after each heading
+            - first_h1: (offset, text) of the first h1 (used as title), or (-1, "")
+        """
+        offsets = []
+        states = []
+        first_h1 = (-1, "")
         current_h1 = current_h2 = current_h3 = ""
         
-        for match in re.finditer(heading_pattern, text[:chunk_start], re.MULTILINE):
+        for match in HEADING_PATTERN.finditer(text):
             level = len(match.group(1))
             heading_text = match.group(2).strip()
             
             if level == 1:
                 current_h1 = heading_text
                 current_h2 = current_h3 = ""  # Reset sub-headings
-                if not headings["title"]:  # Use first h1 as title
-                    headings["title"] = heading_text
+                if first_h1[0] == -1:
+                    first_h1 = (match.start(), heading_text)
             elif level == 2:
                 current_h2 = heading_text
                 current_h3 = ""  # Reset sub-heading
             elif level == 3:
                 current_h3 = heading_text
+            
+            offsets.append(match.start())
+            states.append((current_h1, current_h2, current_h3))
         
-        headings["h1"] = current_h1
-        headings["h2"] = current_h2
-        headings["h3"] = current_h3
+        return offsets, states, first_h1
+    
+    def extract_heading_context(self, text: str, chunk_start: int, heading_index=None) -> Dict[str, str]:
+        """
+        Extract heading context (h1, h2, h3) for a chunk position in markdown text.
+        Pass a precomputed build_heading_index(text) to avoid rescanning per chunk.
+        """
+        if heading_index is None:
+            heading_index = self.build_heading_index(text)
+        offsets, states, first_h1 = heading_index
         
-        return headings
+        # Last heading that starts before the chunk position
+        pos = bisect.bisect_left(offsets, chunk_start)
+        current_h1, current_h2, current_h3 = states[pos - 1] if pos > 0 else ("", "", "")
+        
+        return {
+            "h1": current_h1,
+            "h2": current_h2,
+            "h3": current_h3,
+            "title": first_h1[1] if 0 <= first_h1[0] < chunk_start else "",
+        }
     
-    def create_chunks(self, text: str, file_path: Path) -> List[Dict]:
-        """Split text into chunks with enhanced metadata."""
-        chunks = self.text_splitter.split_text(text)
+    def iter_chunks(
+        self,
+        text: str,
+        file_path: Path,
+        relative_path: Optional[str] = None,
+        page_index: Optional[Tuple[List[int], List[int]]] = None,
+        extra_metadata: Optional[Dict] = None,
+    ) -> Iterator[Tuple[str, str, Dict]]:
+        """
+        Split text into chunks with enhanced metadata.
+        Yields (chunk_id, text, metadata) per chunk; chunk_id is {doc_id}_{index}.
+        relative_path may be passed in when the caller already computed it.
+        page_index is (page_starts, page_numbers) from read_pdf; when given, each
+        chunk gets page_start/page_end metadata. extra_metadata is merged into
+        every chunk's metadata (e.g. content_hash).
+        """
+        split_docs = self.text_splitter.create_documents([text])
         
-        # Calculate relative path and doc_id
-        try:
-            relative_path = file_path.relative_to(self.data_dir)
-        except ValueError:
-            relative_path = file_path
+        # Per-file values, computed once for all chunks
+        if relative_path is None:
+            relative_path = self._doc_key(file_path)
+        source_group = self._get_source_group(relative_path)
+        doc_id = hashlib.sha1(relative_path.encode()).hexdigest()[:12]
         
-        # Generate stable doc_id from relative path
-        doc_id = hashlib.sha1(str(relative_path).encode()).hexdigest()[:12]
+        # Keys shared by every chunk of this file; each chunk copies and extends it
+        base_meta = {
+            "source": str(file_path),
+            "filename": file_path.name,
+            "relative_path": relative_path,
+            "source_group": source_group,
+            "file_type": file_path.suffix,
+            "doc_id": doc_id,
+            "total_chunks": len(split_docs),
+        }
+        if extra_metadata:
+            base_meta.update(extra_metadata)
         
         # Detect if file is markdown for heading extraction
         is_markdown = file_path.suffix.lower() in ['.md', '.markdown']
         
-        chunk_dicts = []
+        # Index headings once per document; each chunk then does a binary search
+        heading_index = self.build_heading_index(text) if is_markdown else None
+        
+        if page_index:
+            page_starts, page_numbers = page_index
+        
         char_offset = 0
         
-        for i, chunk in enumerate(chunks):
-            # Find chunk position in original text for heading context
-            chunk_start = text.find(chunk, char_offset)
+        for i, split_doc in enumerate(split_docs):
+            chunk = split_doc.page_content
+            # Chunk position in original text, as tracked by the splitter
+            chunk_start = split_doc.metadata.get("start_index", -1)
             if chunk_start == -1:
                 chunk_start = char_offset
             
             # Extract heading context for markdown files
             heading_context = {}
             if is_markdown:
-                heading_context = self.extract_heading_context(text, chunk_start)
-            
-            # Determine source_group from top-level folder
-            source_group = self._get_source_group(relative_path)
+                heading_context = self.extract_heading_context(text, chunk_start, heading_index)
             
             metadata = {
-                "source": str(file_path),
-                "filename": file_path.name,
-                "relative_path": str(relative_path),
-                "source_group": source_group,
-                "file_type": file_path.suffix,
-                "doc_id": doc_id,
+                **base_meta,
                 "chunk_id": i,
-                "total_chunks": len(chunks),
                 "start_char": chunk_start,
                 "end_char": chunk_start + len(chunk),
             }
             
+            # PDF page range of the chunk
+            if page_index:
+                first = max(bisect.bisect_right(page_starts, chunk_start) - 1, 0)
+                last = max(bisect.bisect_right(page_starts, chunk_start + len(chunk) - 1) - 1, first)
+                metadata["page_start"] = page_numbers[first]
+                metadata["page_end"] = page_numbers[last]
+            
             # Add heading context if available
             if heading_context:
                 metadata.update({
@@ -241,106 +408,363 @@ class DocumentIngestion:
                     "h3": heading_context.get("h3", ""),
                 })
             
-            chunk_dicts.append({
-                "text": chunk,
-                "metadata": metadata
-            })
+            yield f"{doc_id}_{i}", chunk, metadata
             
             # Update offset for next chunk
             char_offset = chunk_start + len(chunk)
-        
-        return chunk_dicts
     
-    def ingest_file(self, file_path: Path) -> bool:
-        """Ingest a single file into the database."""
+    def create_chunks(self, text: str, file_path: Path) -> List[Dict]:
+        """Split text into chunks with enhanced metadata (list form of iter_chunks)."""
+        return [
+            {"text": chunk, "metadata": metadata}
+            for _, chunk, metadata in self.iter_chunks(text, file_path)
+        ]
+    
+    def prepare_file(self, file_path: Path) -> Optional[Tuple[List[str], List[str], List[Dict]]]:
+        """
+        Read and chunk a single file without touching the database.
+        Returns (ids, documents, metadatas) or None if nothing could be ingested.
+        """
         # Calculate relative path and source_group for logging
-        try:
-            relative_path = file_path.relative_to(self.data_dir)
-        except ValueError:
-            relative_path = file_path
+        relative_path = self._doc_key(file_path)
         source_group = self._get_source_group(relative_path)
         
         print(f"📄 Ingesting: {file_path.name}")
         print(f"   → relative_path: {relative_path}, source_group: {source_group}")
         
-        # Read file
-        content = self.read_file(file_path)
-        if not content:
-            return False
-        
-        # Create chunks
-        chunks = self.create_chunks(content, file_path)
-        if not chunks:
-            print(f"⚠ No chunks created for {file_path.name}")
-            return False
+        # Stat before reading so a write during ingestion shows up as a change next run
+        file_sig = self._file_sig(file_path)
         
-        # First, remove any existing chunks for this file
-        self.remove_file(file_path)
+        # Read file; PDFs also return page offsets for page_start/page_end
+        page_index = None
+        if file_path.suffix == '.pdf':
+            pdf = self.read_pdf(file_path)
+            if pdf:
+                content, page_index = pdf[0], pdf[1:]
+            else:
+                content = None
+        else:
+            content = self.read_file(file_path)
+        if not content:
+            return None
         
-        # Generate unique file identifier from relative path
-        try:
-            relative_path = file_path.relative_to(self.data_dir)
-        except ValueError:
-            relative_path = file_path
-        file_hash = hashlib.sha1(str(relative_path).encode()).hexdigest()[:12]
+        # Content hash lets re-ingestion skip files that did not change
+        content_hash = hashlib.sha1(content.encode("utf-8")).hexdigest()
         
-        # Prepare data for ChromaDB
+        # Stream chunks straight into the ChromaDB column lists
         ids = []
         documents = []
         metadatas = []
         
-        for chunk in chunks:
-            # Use hash of relative path + chunk index for unique IDs
-            chunk_id = f"{file_hash}_{chunk['metadata']['chunk_id']}"
+        extra_metadata = {'content_hash': content_hash}
+        if file_sig is not None:
+            extra_metadata['file_sig'] = file_sig
+        
+        for chunk_id, chunk, metadata in self.iter_chunks(content, file_path, relative_path, page_index, extra_metadata):
             ids.append(chunk_id)
-            documents.append(chunk['text'])
-            metadatas.append(chunk['metadata'])
+            documents.append(chunk)
+            metadatas.append(metadata)
+        
+        if not ids:
+            print(f"⚠ No chunks created for {file_path.name}")
+            return None
+        
+        return ids, documents, metadatas
+
+
+# Per-process preparer cache for ProcessPoolExecutor workers
+_worker_preparers: Dict[str, DocumentPreparer] = {}
+
+
+def _prepare_file_worker(file_path: Path, data_dir: str) -> Optional[Tuple[List[str], List[str], List[Dict]]]:
+    """Process-pool entry point: read and chunk one file in a worker process."""
+    preparer = _worker_preparers.get(data_dir)
+    if preparer is None:
+        preparer = DocumentPreparer(data_dir)
+        _worker_preparers[data_dir] = preparer
+    return preparer.prepare_file(file_path)
+
+
+class DocumentIngestion(DocumentPreparer):
+    """Handles document ingestion into ChromaDB."""
+    
+    def __init__(self, data_dir: str = None, db_path: str = "./chroma_db"):
+        super().__init__(data_dir)
+        
+        # DB-path remains in home (~/.local-mcp-kb/chroma_db) as before
+        if db_path == "./chroma_db":
+            self.db_path = Path.home() / ".local-mcp-kb" / "chroma_db"
+        else:
+            self.db_path = Path(db_path).resolve()
+        
+        # Make sure the directory exists and is writable
+        self.db_path.mkdir(parents=True, exist_ok=True)
+        
+        import chromadb  # type: ignore
+        from chromadb.config import Settings  # type: ignore
+        
+        self.client = chromadb.PersistentClient(
+            path=str(self.db_path),
+            settings=Settings(
+                anonymized_telemetry=False,
+                allow_reset=True,
+                is_persistent=True
+            )
+        )
+        
+        self.device = _default_device()
+        
+        # Embedding function attached to the collection, sharing self.encoder's model
+        self.embedding_function = _get_embedding_function(EMBEDDING_MODEL, self.device)
+        
+        # Explicit encoder for batched document and query embedding
+        self.encoder = _get_encoder(EMBEDDING_MODEL, self.device)
+        
+        # Per-instance LRU cache: query text -> embedding (repeated queries skip the encoder)
+        self._embed_query = functools.lru_cache(maxsize=QUERY_CACHE_SIZE)(self._encode_query)
+        
+        # Get or create collection with embedding function
+        # If collection exists with different embedding function, delete and recreate
+        try:
+            self.collection = self.client.get_or_create_collection(
+                name="knowledge_base",
+                metadata=COLLECTION_METADATA,
+                embedding_function=self.embedding_function
+            )
+        except ValueError as e:
+            if "embedding function conflict" in str(e).lower():
+                print("⚠ Resetting collection to use new embedding function...")
+                self.client.delete_collection("knowledge_base")
+                self.collection = self.client.create_collection(
+                    name="knowledge_base",
+                    metadata=COLLECTION_METADATA,
+                    embedding_function=self.embedding_function
+                )
+            else:
+                raise
         
-        # Add to ChromaDB (it will handle embeddings automatically)
+        print(f"✓ DocumentIngestion initialized")
+        print(f"  - Data directory: {self.data_dir}")
+        print(f"  - Database path: {self.db_path}")
+        print(f"  - Embedding device: {self.device}")
+        print(f"  - Current documents: {self.collection.count()}")
+    
+    def embed_documents(self, documents: List[str]) -> np.ndarray:
+        """
+        Embed documents in one batched encode call (bypasses Chroma's per-add embedding).
+        Returns a contiguous float32 array; Chroma accepts it directly, so no .tolist() boxing.
+        """
+        return self.encoder.encode(
+            documents,
+            batch_size=EMBED_BATCH_SIZE,
+            show_progress_bar=False,
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+        ).astype("float32", copy=False)
+    
+    def is_unchanged(self, metadata: Dict, sig_updates: Optional[List[Tuple[str, str]]] = None) -> bool:
+        """
+        True if the stored chunks for this file carry the same content_hash.
+        When only the file_sig differs (file touched, git checkout), the stored
+        file_sig is refreshed so the next ingest_directory skips the file unread:
+        right away, or - when sig_updates is given - by appending (relative_path,
+        file_sig) for the caller to apply once no other write is in flight.
+        """
         try:
-            self.collection.add(
+            existing = self.collection.get(
+                where={"relative_path": metadata["relative_path"]},
+                limit=1,
+                include=["metadatas"]
+            )
+        except Exception as e:
+            print(f"⚠ Could not check stored chunks (relative_path='{metadata['relative_path']}'): {e}")
+            return False
+        stored = existing["metadatas"][0] if existing.get("metadatas") else {}
+        if stored.get("content_hash") != metadata["content_hash"]:
+            return False
+        file_sig = metadata.get("file_sig")
+        if file_sig and stored.get("file_sig") != file_sig:
+            if sig_updates is None:
+                self.update_file_sig(metadata["relative_path"], file_sig)
+            else:
+                sig_updates.append((metadata["relative_path"], file_sig))
+        return True
+    
+    def update_file_sig(self, relative_path: str, file_sig: str) -> None:
+        """Set file_sig on all chunks of a file; other metadata keys are left as they are."""
+        try:
+            ids = self.collection.get(where={"relative_path": relative_path}, include=[])["ids"]
+            for start in range(0, len(ids), GET_BATCH_SIZE):
+                batch = ids[start:start + GET_BATCH_SIZE]
+                self.collection.update(ids=batch, metadatas=[{"file_sig": file_sig}] * len(batch))
+        except Exception as e:
+            print(f"⚠ Could not update file_sig (relative_path='{relative_path}'): {e}")
+    
+    def stored_file_sigs(self) -> Dict[str, str]:
+        """
+        Map relative_path -> file_sig for everything already in the collection.
+        Reads only the first chunk (chunk_id 0) of each file, so the scan grows with
+        the number of files rather than the number of chunks.
+        """
+        sigs = {}
+        try:
+            for meta in self.iter_metadatas(where={"chunk_id": 0}):
+                rel = meta.get("relative_path")
+                if rel is not None and meta.get("file_sig"):
+                    sigs[rel] = meta["file_sig"]
+        except Exception as e:
+            print(f"⚠ Could not load stored file signatures: {e}")
+        return sigs
+    
+    def kb_version(self) -> str:
+        """Current knowledge base version ("" until the first write); changes on every write."""
+        try:
+            return (self.db_path / KB_VERSION_FILE).read_text(encoding="utf-8")
+        except OSError:
+            return ""
+    
+    def bump_kb_version(self) -> None:
+        """Mark the knowledge base as changed for readers in this and other processes."""
+        version_path = self.db_path / KB_VERSION_FILE
+        tmp_path = version_path.with_name(f"{KB_VERSION_FILE}.{os.getpid()}.tmp")
+        try:
+            tmp_path.write_text(uuid.uuid4().hex, encoding="utf-8")
+            os.replace(tmp_path, version_path)
+        except OSError as e:
+            print(f"⚠ Could not update {KB_VERSION_FILE}: {e}")
+    
+    def _encode_query(self, query_text: str) -> Tuple[float, ...]:
+        """Embed a single query the same way documents are embedded (cached via _embed_query)."""
+        vec = self.encoder.encode([query_text], show_progress_bar=False, normalize_embeddings=True)[0]
+        return tuple(vec.tolist())
+    
+    def ingest_file(self, file_path: Path) -> bool:
+        """
+        Ingest a single file into the database.
+        Unchanged files (same content_hash) are skipped; changed files are upserted.
+        """
+        prepared = self.prepare_file(file_path)
+        if prepared is None:
+            return False
+        ids, documents, metadatas = prepared
+        
+        if self.is_unchanged(metadatas[0]):
+            print(f"⏭️  Unchanged, skipping: {file_path.name}")
+            return True
+        
+        # Drop chunks beyond the new chunk count; the rest are updated in place
+        self.remove_stale_chunks(file_path, len(ids))
+        
+        # Upsert into ChromaDB with precomputed embeddings
+        try:
+            self.collection.upsert(
                 ids=ids,
                 documents=documents,
-                metadatas=metadatas
+                metadatas=metadatas,
+                embeddings=self.embed_documents(documents)
             )
-            print(f"✓ Ingested {len(chunks)} chunks from {file_path.name}")
+            self.bump_kb_version()
+            print(f"✓ Ingested {len(ids)} chunks from {file_path.name}")
             return True
         except Exception as e:
             print(f"✗ Error ingesting {file_path.name}: {e}")
             return False
     
-    def remove_file(self, file_path: Path) -> int:
+    def remove_stale_chunks(self, file_path: Path, keep_count: int) -> int:
         """
-        Remove all chunks of a file from the database.
-        Uses relative_path metadata for precise matching (handles same filename in different dirs).
+        Remove chunks of a file whose chunk_id >= keep_count (left over when a file shrinks).
         Returns: number of chunks removed (0 if none found or error)
         """
         try:
-            # Calculate relative path to match what's stored in metadata
-            try:
-                relative_path = file_path.relative_to(self.data_dir)
-            except ValueError:
-                relative_path = file_path
-            
-            rel_path_str = str(relative_path)
-            
-            # Filter on relative_path to handle files with same name in different directories
+            rel_path_str = self._doc_key(file_path)
             results = self.collection.get(
-                where={"relative_path": rel_path_str}
+                where={"$and": [
+                    {"relative_path": rel_path_str},
+                    {"chunk_id": {"$gte": keep_count}},
+                ]},
+                include=[]
             )
             
             if results['ids']:
                 chunk_count = len(results['ids'])
                 self.collection.delete(ids=results['ids'])
-                print(f"🗑️  Removed {chunk_count} chunks for relative_path='{rel_path_str}'")
+                self.bump_kb_version()
+                print(f"🗑️  Removed {chunk_count} stale chunks for relative_path='{rel_path_str}'")
                 return chunk_count
             return 0
         except Exception as e:
-            print(f"✗ Error removing file (relative_path='{file_path}'): {e}")
+            print(f"✗ Error removing stale chunks (relative_path='{file_path}'): {e}")
             return 0
     
-    def ingest_directory(self, directory: Optional[Path] = None) -> int:
-        """Ingest all supported files in a directory and its subdirectories."""
+    def remove_stale_chunks_batch(self, stale: List[Tuple[str, int]]) -> int:
+        """
+        Remove stale chunks for many files with one collection.delete.
+        stale: (relative_path, keep_count) pairs, as collected per ingest batch.
+        Returns: number of files covered (0 if nothing to do or error)
+        """
+        if not stale:
+            return 0
+        clauses = [
+            {"$and": [{"relative_path": rel}, {"chunk_id": {"$gte": keep}}]}
+            for rel, keep in stale
+        ]
+        where = clauses[0] if len(clauses) == 1 else {"$or": clauses}
+        try:
+            self.collection.delete(where=where)
+            self.bump_kb_version()
+            return len(stale)
+        except Exception as e:
+            print(f"✗ Error removing stale chunks for {len(stale)} files: {e}")
+            return 0
+    
+    def remove_file(self, file_path: Path) -> int:
+        """
+        Remove all chunks of a file from the database.
+        Uses relative_path metadata for precise matching (handles same filename in different dirs).
+        Returns: number of chunks removed (0 if none found or error)
+        """
+        return self.remove_files([file_path])
+    
+    def remove_files(self, file_paths: List[Path]) -> int:
+        """
+        Remove all chunks of several files with one collection.delete, matching
+        relative_path with $in. Returns: number of chunks removed (0 if none found or error)
+        """
+        rel_paths = [self._doc_key(fp) for fp in file_paths]
+        if not rel_paths:
+            return 0
+        try:
+            where = {"relative_path": rel_paths[0]} if len(rel_paths) == 1 else {"relative_path": {"$in": rel_paths}}
+            # Delete by filter, no id lookup; the removed count comes from count() around it
+            count_before = self.collection.count()
+            self.collection.delete(where=where)
+            chunk_count = max(0, count_before - self.collection.count())
+            self.bump_kb_version()
+            
+            if chunk_count > 0:
+                if len(rel_paths) == 1:
+                    print(f"🗑️  Removed {chunk_count} chunks for relative_path='{rel_paths[0]}'")
+                else:
+                    print(f"🗑️  Removed {chunk_count} chunks for {len(rel_paths)} files")
+            return chunk_count
+        except Exception as e:
+            print(f"✗ Error removing files (relative_path={rel_paths[:3]}): {e}")
+            return 0
+    
+    def ingest_directory(
+        self,
+        directory: Optional[Path] = None,
+        batch_size: Optional[int] = None,
+        workers: Optional[int] = None,
+    ) -> int:
+        """
+        Ingest all supported files in a directory and its subdirectories.
+        Files are read and chunked in a process pool of `workers` processes
+        (default: INGEST_WORKERS). Unchanged files are skipped: first by file_sig
+        (mtime/size, no read), then by content_hash.
+        Chunks are buffered across files and written with one collection.upsert
+        per batch_size chunks (default: INGEST_BATCH_SIZE).
+        """
         if directory is None:
             directory = self.data_dir
         
@@ -348,14 +772,15 @@ class DocumentIngestion:
             print(f"✗ Directory does not exist: {directory}")
             return 0
         
-        supported_extensions = {'.md', '.txt', '.pdf'}
-        # Recursively find all supported files
+        # Recursively find all supported files in a single directory walk
         files = []
-        for ext in supported_extensions:
-            files.extend(directory.rglob(f"*{ext}"))
+        for root, _dirs, filenames in os.walk(directory):
+            for name in filenames:
+                if os.path.splitext(name)[1] in SUPPORTED_EXTENSIONS:
+                    files.append(Path(root) / name)
         
         # Sort files to process PDFs, markdown, then text files
-        files = sorted(files, key=lambda f: (f.suffix != '.pdf', f.suffix != '.md', str(f)))
+        files.sort(key=lambda f: (EXT_RANK.get(f.suffix, len(EXT_RANK)), str(f)))
         
         # Count by type for reporting
         file_types = {}
@@ -365,19 +790,128 @@ class DocumentIngestion:
         print(f"\n📚 Starting batch ingestion of {len(files)} files (including subdirectories)...")
         print(f"   File breakdown: {', '.join(f'{count} {ext} files' for ext, count in sorted(file_types.items()))}")
         
+        batch_size = batch_size or INGEST_BATCH_SIZE
+        
         success_count = 0
+        skipped_count = 0
         failed_files = []
-        for file_path in files:
+        
+        # Files whose mtime/size match the stored file_sig are skipped without being read
+        stored_sigs = self.stored_file_sigs()
+        pending = []
+        for f in files:
+            sig = stored_sigs.get(self._doc_key(f))
+            if sig is not None and sig == self._file_sig(f):
+                skipped_count += 1
+                success_count += 1
+            else:
+                pending.append(f)
+        
+        # Writer thread: upserts one batch while the main thread prepares/embeds the next.
+        # maxsize=2 gives double buffering with natural backpressure.
+        write_queue: queue.Queue = queue.Queue(maxsize=2)
+        written_files: List[Path] = []
+        # file_sig refreshes for touched but unchanged files, applied after the writer stops
+        sig_updates: List[Tuple[str, str]] = []
+        
+        def writer() -> None:
+            while True:
+                item = write_queue.get()
+                if item is None:
+                    break
+                ids, docs, metas, embeddings, paths, stale = item
+                try:
+                    # Chunks beyond the new chunk count never collide with the upserted ids
+                    self.remove_stale_chunks_batch(stale)
+                    self.collection.upsert(
+                        ids=ids,
+                        documents=docs,
+                        metadatas=metas,
+                        embeddings=embeddings
+                    )
+                    self.bump_kb_version()
+                    written_files.extend(paths)
+                    print(f"✓ Flushed {len(ids)} chunks from {len(paths)} files")
+                except Exception as e:
+                    failed_files.extend((str(fp), str(e)) for fp in paths)
+                    print(f"✗ Error adding batch of {len(ids)} chunks: {e}")
+        
+        writer_thread = threading.Thread(target=writer, name="chroma-writer", daemon=True)
+        writer_thread.start()
+        
+        # Rolling buffer shared across files; flushed with a single collection.upsert
+        batch_ids: List[str] = []
+        batch_docs: List[str] = []
+        batch_metas: List[Dict] = []
+        batch_files: List[Path] = []
+        batch_stale: List[Tuple[str, int]] = []
+        
+        def flush() -> None:
+            nonlocal batch_ids, batch_docs, batch_metas, batch_files, batch_stale
+            if not batch_ids:
+                return
             try:
-                if self.ingest_file(file_path):
-                    success_count += 1
-                else:
-                    failed_files.append((str(file_path), "Ingestion returned False"))
+                embeddings = self.embed_documents(batch_docs)
+                write_queue.put((batch_ids, batch_docs, batch_metas, embeddings, batch_files, batch_stale))
             except Exception as e:
-                failed_files.append((str(file_path), str(e)))
-                print(f"✗ Exception ingesting {file_path.name}: {e}")
+                failed_files.extend((str(fp), str(e)) for fp in batch_files)
+                print(f"✗ Error embedding batch of {len(batch_ids)} chunks: {e}")
+            batch_ids, batch_docs, batch_metas, batch_files, batch_stale = [], [], [], [], []
+        
+        # Read + chunk in worker processes; Chroma writes stay on this process (single writer).
+        # At most 2 * workers files are in flight, so prepared chunks cannot pile up
+        # ahead of the embed/write pipeline (the write queue's backpressure holds).
+        workers = min(workers or INGEST_WORKERS, len(pending))
+        executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+        in_flight: Deque[Future] = deque()
+        next_index = 0
+        data_dir = str(self.data_dir)
         
-        print(f"\n✓ Batch ingestion complete: {success_count}/{len(files)} files")
+        try:
+            for file_path in pending:
+                if executor is not None:
+                    while next_index < len(pending) and len(in_flight) < 2 * workers:
+                        in_flight.append(executor.submit(_prepare_file_worker, pending[next_index], data_dir))
+                        next_index += 1
+                    future = in_flight.popleft()
+                try:
+                    prepared = future.result() if executor is not None else self.prepare_file(file_path)
+                    if prepared is None:
+                        failed_files.append((str(file_path), "Ingestion returned False"))
+                        continue
+                    ids, documents, metadatas = prepared
+                    
+                    if self.is_unchanged(metadatas[0], sig_updates):
+                        skipped_count += 1
+                        success_count += 1
+                        continue
+                    
+                    # Stale chunks are deleted per batch by the writer, together with the upsert
+                    batch_stale.append((metadatas[0]["relative_path"], len(ids)))
+                    batch_ids.extend(ids)
+                    batch_docs.extend(documents)
+                    batch_metas.extend(metadatas)
+                    batch_files.append(file_path)
+                    
+                    if len(batch_ids) >= batch_size:
+                        flush()
+                except Exception as e:
+                    failed_files.append((str(file_path), str(e)))
+                    print(f"✗ Exception ingesting {file_path.name}: {e}")
+        finally:
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+        
+        flush()
+        write_queue.put(None)
+        writer_thread.join()
+        
+        # Applied after the writer has finished, so Chroma keeps a single writer
+        for rel, sig in sig_updates:
+            self.update_file_sig(rel, sig)
+        success_count += len(written_files)
+        
+        print(f"\n✓ Batch ingestion complete: {success_count}/{len(files)} files ({skipped_count} unchanged)")
         if failed_files:
             print(f"⚠ Failed to ingest {len(failed_files)} files:")
             for fpath, reason in failed_files[:5]:  # Show first 5 failures
@@ -399,7 +933,7 @@ class DocumentIngestion:
         """
         try:
             query_kwargs = {
-                "query_texts": [query_text],
+                "query_embeddings": [list(self._embed_query(query_text))],
                 "n_results": n_results,
             }
             if where:
@@ -419,25 +953,52 @@ class DocumentIngestion:
         """
         Retrieve multiple chunks by their IDs.
         Returns a dict mapping chunk_id -> {"text": ..., "metadata": ...}
+        
+        IDs are fetched in batches of GET_BATCH_SIZE to stay under SQLite's
+        bound-variable limit for the underlying IN (...) query.
         """
         if not chunk_ids:
             return {}
         try:
-            res = self.collection.get(
-                ids=chunk_ids,
-                include=["documents", "metadatas"]
-            )
             result = {}
-            for i, cid in enumerate(res.get("ids", [])):
-                result[cid] = {
-                    "text": (res.get("documents") or [])[i] if res.get("documents") else "",
-                    "metadata": (res.get("metadatas") or [])[i] if res.get("metadatas") else {}
-                }
+            for start in range(0, len(chunk_ids), GET_BATCH_SIZE):
+                res = self.collection.get(
+                    ids=chunk_ids[start:start + GET_BATCH_SIZE],
+                    include=["documents", "metadatas"]
+                )
+                docs = res.get("documents") or []
+                metas = res.get("metadatas") or []
+                result.update({
+                    cid: {
+                        "text": docs[i] if i < len(docs) else "",
+                        "metadata": metas[i] if i < len(metas) else {}
+                    }
+                    for i, cid in enumerate(res.get("ids", []))
+                })
             return result
         except Exception as e:
             print(f"✗ Error getting chunks by ids: {e}")
             return {}
     
+    def iter_metadatas(self, page_size: int = 5000, where: Optional[Dict] = None) -> Iterator[Dict]:
+        """Yield chunk metadatas (optionally filtered by where), fetched from Chroma in pages of page_size."""
+        offset = 0
+        while True:
+            batch = self.collection.get(where=where, include=["metadatas"], limit=page_size, offset=offset)
+            metadatas = batch.get("metadatas") or []
+            if not metadatas:
+                break
+            yield from metadatas
+            offset += page_size
+    
+    def source_group_counts(self) -> Dict[str, int]:
+        """Count chunks per source_group with a paged metadata scan."""
+        counts: Dict[str, int] = {}
+        for meta in self.iter_metadatas():
+            sg = meta.get("source_group", "unknown")
+            counts[sg] = counts.get(sg, 0) + 1
+        return counts
+    
     def get_stats(self) -> Dict:
         """Get database statistics."""
         return {
@@ -455,28 +1016,22 @@ class DocumentIngestion:
         Also shows distribution of source_groups.
         """
         import random
-        from collections import Counter
         
         print(f"\n🔬 SANITY CHECK: {sample_size} random documents")
         print("=" * 60)
         
-        # Get all unique relative_paths
         try:
-            all_docs = self.collection.get(include=["metadatas"])
-            if not all_docs['ids']:
+            # One metadata per document: only the first chunk of each file
+            first_chunks = self.collection.get(where={"chunk_id": 0}, include=["metadatas"])
+            unique_docs = {
+                meta.get('relative_path', 'unknown'): meta
+                for meta in first_chunks.get('metadatas') or []
+            }
+            
+            if not unique_docs:
                 print("  No documents in database!")
                 return
             
-            # Group by relative_path to get unique docs
-            unique_docs = {}
-            source_group_counts = Counter()
-            for i, meta in enumerate(all_docs['metadatas']):
-                rel_path = meta.get('relative_path', 'unknown')
-                sg = meta.get('source_group', 'unknown')
-                source_group_counts[sg] += 1
-                if rel_path not in unique_docs:
-                    unique_docs[rel_path] = meta
-            
             # Sample random docs
             sample_paths = random.sample(list(unique_docs.keys()), min(sample_size, len(unique_docs)))
             
@@ -489,7 +1044,7 @@ class DocumentIngestion:
             
             print(f"\n  Total unique documents: {len(unique_docs)}")
             print(f"\n  📊 SOURCE_GROUP DISTRIBUTION (chunks):")
-            for sg, count in sorted(source_group_counts.items(), key=lambda x: -x[1]):
+            for sg, count in sorted(self.source_group_counts().items(), key=lambda x: -x[1]):
                 print(f"      {sg:12}: {count:5} chunks")
             print("=" * 60)
             
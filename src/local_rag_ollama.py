@@ -16,7 +16,9 @@ import os
 import re
 import sys
 import json
+import functools
 import requests  # type: ignore
+from collections import OrderedDict
 from pathlib import Path
 from typing import List, Dict, Tuple, Optional, Set
 from ingestion import DocumentIngestion
@@ -32,11 +34,22 @@ RAG_TOP_K_FULL = int(os.environ.get("RAG_TOP_K_FULL", "6"))  # More full-text ch
 RAG_MAX_CHARS_FULL = int(os.environ.get("RAG_MAX_CHARS_FULL", "4500"))
 RAG_SNIPPET_CHARS = int(os.environ.get("RAG_SNIPPET_CHARS", "400"))
 RAG_NUM_CTX = int(os.environ.get("RAG_NUM_CTX", "8192"))
+# How long Ollama keeps the model (and its prompt cache) loaded between questions
+RAG_KEEP_ALIVE = os.environ.get("RAG_KEEP_ALIVE", "30m")
 
 # TOC filtering and chunk expansion
 RAG_FILTER_TOC = os.environ.get("RAG_FILTER_TOC", "1") == "1"
 RAG_PDF_EXPAND = os.environ.get("RAG_PDF_EXPAND", "1") == "1"
 RAG_PDF_EXPAND_RADIUS = int(os.environ.get("RAG_PDF_EXPAND_RADIUS", "2"))
+# Number of chunk texts whose TOC classification is remembered across questions
+RAG_TOC_CACHE_SIZE = int(os.environ.get("RAG_TOC_CACHE_SIZE", "4096"))
+# Validated answers kept per session for repeated questions over identical context (0 = off)
+RAG_ANSWER_CACHE_SIZE = int(os.environ.get("RAG_ANSWER_CACHE_SIZE", "128"))
+# Retrieval results kept per session for repeated questions (0 = off)
+RAG_RETRIEVAL_CACHE_SIZE = int(os.environ.get("RAG_RETRIEVAL_CACHE_SIZE", "128"))
+
+# Print per-question retrieval details (TOC filtering, allowed IDs, sources)
+RAG_VERBOSE = os.environ.get("RAG_VERBOSE", "1") == "1"
 
 # Source diversity: max chunks per single source file
 # Increased to 5 to allow more technical documentation from same source
@@ -47,6 +60,10 @@ RAG_MAX_PER_SOURCE = int(os.environ.get("RAG_MAX_PER_SOURCE", "5"))
 # Lowered to 0.25 to accommodate semantic gap between natural questions and technical docs
 RAG_MIN_SCORE = float(os.environ.get("RAG_MIN_SCORE", "0.25"))
 
+# One HTTP session for all Ollama calls: keeps the connection alive across
+# the tags check, the answer and its validation retry
+_OLLAMA_SESSION = requests.Session()
+
 # ============================================================================
 # STRICT CITATION ENFORCEMENT CONSTANTS
 # ============================================================================
@@ -76,12 +93,24 @@ IDK_PATTERN = re.compile(
 # ============================================================================
 # TOC Detection Heuristic
 # ============================================================================
+# Compiled once at import; is_toc_like runs for every retrieved chunk
+DOT_LEADER_PATTERN = re.compile(r'\.{3,}|…{2,}')
+PAGE_NUMBER_PATTERN = re.compile(r'\s+\d{1,4}\s*$', re.MULTILINE)
+TOC_ENTRY_PATTERN = re.compile(r'^.{5,50}\s+\d{1,4}\s*$', re.MULTILINE)
+TOC_KEYWORDS = ('contents', 'table of contents', 'index', 'overview', 'chapter')
+
+
 def is_toc_like(text: str) -> Tuple[bool, List[str]]:
     """
     Detect if a chunk looks like a Table of Contents / index page.
     
     Returns: (is_toc, list_of_reasons)
     """
+    # Fast reject: with fewer than 3 newlines and no dot leaders, none of the
+    # heuristics below can fire (each needs several lines or dot runs)
+    if text.count('\n') < 3 and '...' not in text and '……' not in text:
+        return False, []
+    
     reasons = []
     lines = text.strip().split('\n')
     
@@ -94,24 +123,22 @@ def is_toc_like(text: str) -> Tuple[bool, List[str]]:
         reasons.append("many_short_lines")
     
     # Heuristic 2: Dot leaders ("....." or "…..")
-    dot_leader_pattern = re.compile(r'\.{3,}|…{2,}')
-    dot_leader_count = len(dot_leader_pattern.findall(text))
+    dot_leader_count = len(DOT_LEADER_PATTERN.findall(text))
     if dot_leader_count >= 3:
         reasons.append(f"dot_leaders({dot_leader_count})")
     
     # Heuristic 3: Numbers at end of lines (page numbers)
-    page_number_pattern = re.compile(r'\s+\d{1,4}\s*$', re.MULTILINE)
-    page_numbers = len(page_number_pattern.findall(text))
+    page_numbers = len(PAGE_NUMBER_PATTERN.findall(text))
     if page_numbers >= 5:
         reasons.append(f"page_numbers({page_numbers})")
     
     # Heuristic 4: TOC keywords
-    toc_keywords = ['contents', 'table of contents', 'index', 'overview', 'chapter']
-    text_lower = text.lower()
-    found_keywords = [kw for kw in toc_keywords if kw in text_lower]
-    # Only count if combined with other signals
-    if found_keywords and len(reasons) >= 1:
-        reasons.append(f"keywords({','.join(found_keywords)})")
+    # Only count if combined with other signals (so most chunks skip the lowercase copy)
+    if reasons:
+        text_lower = text.lower()
+        found_keywords = [kw for kw in TOC_KEYWORDS if kw in text_lower]
+        if found_keywords:
+            reasons.append(f"keywords({','.join(found_keywords)})")
     
     # Heuristic 5: High newline ratio (many line breaks, little content)
     if len(text) > 100:
@@ -120,8 +147,7 @@ def is_toc_like(text: str) -> Tuple[bool, List[str]]:
             reasons.append(f"high_newline_ratio({newline_ratio:.2f})")
     
     # Heuristic 6: Pattern of "Title 123" repeated (TOC entries)
-    toc_entry_pattern = re.compile(r'^.{5,50}\s+\d{1,4}\s*$', re.MULTILINE)
-    toc_entries = len(toc_entry_pattern.findall(text))
+    toc_entries = len(TOC_ENTRY_PATTERN.findall(text))
     if toc_entries >= 4:
         reasons.append(f"toc_entries({toc_entries})")
     
@@ -130,6 +156,16 @@ def is_toc_like(text: str) -> Tuple[bool, List[str]]:
     return is_toc, reasons
 
 
+@functools.lru_cache(maxsize=RAG_TOC_CACHE_SIZE)
+def is_toc_like_cached(text: str) -> Tuple[bool, Tuple[str, ...]]:
+    """
+    is_toc_like, memoized on the chunk text itself.
+    Keyed by content (not chunk id), so re-ingested chunks can never hit a stale entry.
+    """
+    is_toc, reasons = is_toc_like(text)
+    return is_toc, tuple(reasons)
+
+
 # ============================================================================
 # Custom Exception for Citation Validation Failures
 # ============================================================================
@@ -155,12 +191,9 @@ def print_debug_bundle(debug_payload: dict) -> None:
     
     allowed = debug_payload.get('allowed_ids', [])
     print(f"\n📋 Allowed Chunk IDs ({len(allowed)}):")
-    if len(allowed) <= 10:
-        for cid in sorted(allowed):
-            print(f"    ✓ {cid}")
-    else:
-        for cid in sorted(allowed)[:10]:
-            print(f"    ✓ {cid}")
+    for cid in sorted(allowed)[:10]:
+        print(f"    ✓ {cid}")
+    if len(allowed) > 10:
         print(f"    ... and {len(allowed) - 10} more")
     
     print(f"\n📤 User Prompt (truncated):")
@@ -232,6 +265,9 @@ CODE_BLOCK_PATTERN = re.compile(r'```[\s\S]*?```|`[^`]+`')
 # Pattern to detect markdown headers
 HEADER_PATTERN = re.compile(r'^\s*#{1,6}\s+.+$')
 
+# Pattern to detect numbered list items ("1. ", "2. ", ...)
+NUMBERED_ITEM_PATTERN = re.compile(r'^\d+\.\s+')
+
 
 def split_into_blocks(text: str) -> List[Dict[str, str]]:
     """
@@ -243,7 +279,7 @@ def split_into_blocks(text: str) -> List[Dict[str, str]]:
     Code blocks are kept together with any trailing citations.
     """
     blocks = []
-    lines = text.split('\n')
+    lines = text.splitlines()  # also splits \r\n, so no stray '\r' ends up in blocks
     current_block = []
     current_type = None
     in_code_block = False
@@ -281,7 +317,7 @@ def split_into_blocks(text: str) -> List[Dict[str, str]]:
                     j += 1
                 
                 # If next line has citation, include it
-                if j < len(lines) and CITATION_PATTERN.search(lines[j]):
+                if j < len(lines) and '[chunk:' in lines[j] and CITATION_PATTERN.search(lines[j]):
                     current_block.append(lines[j])
                     i = j  # Skip to this line
                 
@@ -314,10 +350,11 @@ def split_into_blocks(text: str) -> List[Dict[str, str]]:
             i += 1
             continue
         
-        # Detect block type
-        is_header = HEADER_PATTERN.match(line)
-        is_bullet = stripped.startswith('- ') or stripped.startswith('* ')
-        is_numbered = bool(re.match(r'^\d+\.\s+', stripped))
+        # Detect block type; the first character decides which check can match at all
+        c0 = stripped[0]
+        is_header = c0 == '#' and HEADER_PATTERN.match(line)
+        is_bullet = c0 in '-*' and stripped[1:2] == ' '
+        is_numbered = c0.isdigit() and bool(NUMBERED_ITEM_PATTERN.match(stripped))
         
         # Start new block if type changes
         new_type = None
@@ -373,12 +410,26 @@ def block_has_trailing_citation(block_content: str) -> Tuple[bool, List[str]]:
     
     "Trailing" = last 100 chars contain at least one [chunk:id].
     """
-    # Check last 100 chars for citations
-    tail = block_content[-100:] if len(block_content) > 100 else block_content
-    citations = CITATION_PATTERN.findall(tail)
+    # Scan only the last 100 chars in place (no tail slice)
+    start = max(0, len(block_content) - 100)
+    if block_content.find("[chunk:", start) == -1:
+        return False, []
+    citations = [m.group(1) for m in CITATION_PATTERN.finditer(block_content, start)]
     return bool(citations), citations
 
 
+def has_evidence(text: str) -> bool:
+    """
+    Check if text contains evidence: a "quote" or a code block.
+    
+    Both patterns need a literal '"' or '`', so a substring test rules most
+    prose out before any regex runs.
+    """
+    if '"' in text and QUOTE_PATTERN.search(text):
+        return True
+    return '`' in text and CODE_BLOCK_PATTERN.search(text) is not None
+
+
 def validate_answer(
     text: str,
     allowed_ids: Set[str],
@@ -472,10 +523,8 @@ def validate_answer(
             # If require_quotes, check if block has evidence
             # Code blocks ARE evidence themselves, so they don't need additional quotes
             if require_quotes and block_type != 'code':
-                quotes = QUOTE_PATTERN.findall(content)
-                code_blocks = CODE_BLOCK_PATTERN.findall(content)
                 # Accept either quotes or code blocks as evidence
-                if not quotes and not code_blocks:
+                if not has_evidence(content):
                     blocks_with_quotes_but_no_citation.append({
                         'index': i,
                         'type': block_type,
@@ -491,8 +540,9 @@ def validate_answer(
         raise CitationValidationError("No citations found", debug_payload)
     
     # FAIL: Invalid citation IDs (hallucinated chunks)
-    invalid_citations = all_citations_found - allowed_ids
-    if invalid_citations:
+    # Subset test first: the happy path allocates no difference set
+    if not all_citations_found <= allowed_ids:
+        invalid_citations = all_citations_found - allowed_ids
         debug_payload['reason'] = f"Invalid chunk IDs - not in allowed set: {invalid_citations}"
         debug_payload['model_output'] = text[:5000]
         debug_payload['found_citations'] = list(all_citations_found)
@@ -504,7 +554,8 @@ def validate_answer(
         )
     
     # FAIL: External URLs detected (hallucination indicator)
-    url_matches = UNSUPPORTED_URL_PATTERN.findall(text_stripped)
+    # Every match contains "://", so most answers skip the regex entirely
+    url_matches = UNSUPPORTED_URL_PATTERN.findall(text_stripped) if "://" in text_stripped else []
     if url_matches:
         unique_urls = set(url_matches)
         debug_payload['reason'] = f"External URLs not allowed - answer must cite local chunks only: {unique_urls}"
@@ -562,7 +613,7 @@ def check_ollama_connection() -> Tuple[bool, List[str]]:
     Returns (is_connected, list_of_model_names).
     """
     try:
-        resp = requests.get(f"{OLLAMA_BASE_URL}/api/tags", timeout=10)
+        resp = _OLLAMA_SESSION.get(f"{OLLAMA_BASE_URL}/api/tags", timeout=10)
         resp.raise_for_status()
         data = resp.json()
         models = [m["name"] for m in data.get("models", [])]
@@ -617,31 +668,21 @@ def get_adjacent_chunk_ids(chunk_id: str, radius: int = 2) -> List[str]:
     """
     Generate adjacent chunk IDs for context expansion.
     
-    Chunk ID format: {hash}_{index:04d}
+    Chunk ID format: {hash}_{index} (as written by DocumentPreparer.iter_chunks)
     Returns list of adjacent IDs (before and after current chunk).
     """
-    if '_' not in chunk_id:
-        return []
-    
-    parts = chunk_id.rsplit('_', 1)
-    if len(parts) != 2:
+    doc_hash, sep, idx_str = chunk_id.rpartition('_')
+    # ASCII digits only: str.isdecimal also accepts e.g. Arabic-Indic digits
+    if not sep or not (idx_str.isascii() and idx_str.isdigit()):
         return []
     
-    doc_hash, idx_str = parts
-    try:
-        current_idx = int(idx_str)
-    except ValueError:
-        return []
-    
-    adjacent = []
-    for offset in range(-radius, radius + 1):
-        if offset == 0:
-            continue  # Skip the current chunk
-        new_idx = current_idx + offset
-        if new_idx >= 0:
-            adjacent.append(f"{doc_hash}_{new_idx:04d}")
-    
-    return adjacent
+    current_idx = int(idx_str)
+    prefix = doc_hash + '_'
+    return [
+        prefix + str(new_idx)
+        for new_idx in range(max(current_idx - radius, 0), current_idx + radius + 1)
+        if new_idx != current_idx
+    ]
 
 
 def retrieve_context(kb: DocumentIngestion, question: str, use_prioritized: bool = True) -> Tuple[List[Dict], Set[str], dict]:
@@ -696,6 +737,9 @@ def retrieve_context(kb: DocumentIngestion, question: str, use_prioritized: bool
     
     diagnostics["fetched"] = len(ids)
     
+    # Source key per candidate, resolved once and shared by both phases
+    sources = [meta.get("relative_path", meta.get("filename", "unknown")) for meta in metadatas]
+    
     # Phase 1: Filter out TOC-like chunks AND enforce source diversity
     filtered_indices = []
     source_counts = {}  # Track how many chunks per source
@@ -703,18 +747,20 @@ def retrieve_context(kb: DocumentIngestion, question: str, use_prioritized: bool
     for i, (doc, meta, dist, chunk_id) in enumerate(zip(documents, metadatas, distances, ids)):
         # TOC filtering
         if RAG_FILTER_TOC:
-            is_toc, toc_reasons = is_toc_like(doc)
+            is_toc, toc_reasons = is_toc_like_cached(doc)
             if is_toc:
                 diagnostics["toc_filtered"] += 1
-                diagnostics["toc_reasons"].append({
-                    "id": chunk_id,
-                    "reasons": toc_reasons,
-                    "preview": doc[:100].replace('\n', '\\n')
-                })
+                # Details only for the first few; main shows at most 3
+                if len(diagnostics["toc_reasons"]) < 3:
+                    diagnostics["toc_reasons"].append({
+                        "id": chunk_id,
+                        "reasons": list(toc_reasons),
+                        "preview": doc[:100].replace('\n', '\\n')
+                    })
                 continue
         
         # Source diversity: limit chunks per source
-        source = meta.get("relative_path", meta.get("filename", "unknown"))
+        source = sources[i]
         current_count = source_counts.get(source, 0)
         if current_count >= RAG_MAX_PER_SOURCE:
             # Skip this chunk, already have enough from this source
@@ -759,21 +805,15 @@ def retrieve_context(kb: DocumentIngestion, question: str, use_prioritized: bool
         allowed_ids.add(chunk_id)
         
         # Track PDF sources for expansion
-        source = meta.get("relative_path", meta.get("filename", ""))
-        if source.lower().endswith(".pdf"):
+        if sources[i].lower().endswith(".pdf"):
             pdf_chunk_ids.append(chunk_id)
             diagnostics["pdf_sources"] += 1
         
-        # Only include full text for top RAG_TOP_K_FULL chunks
-        if rank < RAG_TOP_K_FULL:
-            text = doc.strip()
-            if len(text) > RAG_MAX_CHARS_FULL:
-                text = text[:RAG_MAX_CHARS_FULL].rstrip() + "..."
-        else:
-            # Snippet only for remaining chunks
-            text = doc.strip()
-            if len(text) > RAG_SNIPPET_CHARS:
-                text = text[:RAG_SNIPPET_CHARS].rstrip() + "..."
+        # Full text for the top RAG_TOP_K_FULL chunks, snippets for the rest
+        limit = RAG_MAX_CHARS_FULL if rank < RAG_TOP_K_FULL else RAG_SNIPPET_CHARS
+        text = doc.strip()
+        if len(text) > limit:
+            text = text[:limit].rstrip() + "..."
         
         context_chunks.append({
             "text": text,
@@ -785,13 +825,12 @@ def retrieve_context(kb: DocumentIngestion, question: str, use_prioritized: bool
     
     # Phase 3: Expand PDF chunks with adjacent chunks
     if RAG_PDF_EXPAND and pdf_chunk_ids:
-        expansion_ids = []
+        wanted = set()
         for pdf_id in pdf_chunk_ids[:RAG_TOP_K_FULL]:  # Only expand top chunks
-            adjacent = get_adjacent_chunk_ids(pdf_id, RAG_PDF_EXPAND_RADIUS)
-            expansion_ids.extend([aid for aid in adjacent if aid not in allowed_ids])
+            wanted.update(get_adjacent_chunk_ids(pdf_id, RAG_PDF_EXPAND_RADIUS))
         
-        # Deduplicate expansion IDs before fetching
-        expansion_ids = list(set(expansion_ids))
+        # Deduplicated, minus chunks already in context; sorted for a stable fetch order
+        expansion_ids = sorted(wanted - allowed_ids)
         
         if expansion_ids:
             # Fetch adjacent chunks from database
@@ -804,7 +843,7 @@ def retrieve_context(kb: DocumentIngestion, question: str, use_prioritized: bool
                     
                     # Check if it's TOC
                     if RAG_FILTER_TOC:
-                        is_toc, _ = is_toc_like(chunk_data["text"])
+                        is_toc, _ = is_toc_like_cached(chunk_data["text"])
                         if is_toc:
                             continue
                     
@@ -838,12 +877,13 @@ def build_context_payload(context_chunks: List[Dict]) -> str:
     parts = []
     for chunk in context_chunks:
         meta = chunk["metadata"]
-        source = meta.get("relative_path", meta.get("filename", "unknown"))
-        chunk_id = chunk["id"]
+        source = meta.get("relative_path")
+        if source is None:
+            source = meta.get("filename", "unknown")
         expanded_marker = " (expanded)" if chunk.get("expanded") else ""
         
-        header = f"[chunk:{chunk_id}] source={source}{expanded_marker}"
-        parts.append(f"{header}\n{chunk['text']}")
+        # Header and text in one formatting step; the final join copies each part once
+        parts.append(f"[chunk:{chunk['id']}] source={source}{expanded_marker}\n{chunk['text']}")
     
     return "\n\n---\n\n".join(parts)
 
@@ -851,32 +891,68 @@ def build_context_payload(context_chunks: List[Dict]) -> str:
 # ============================================================================
 # Ollama chat
 # ============================================================================
+# Trailing characters rescanned per streamed token when looking for abort_pattern
+STREAM_ABORT_WINDOW = 256
+
+
 def call_ollama(
     model: str,
     messages: List[Dict[str, str]],
-    temperature: float = 0.1
+    temperature: float = 0.1,
+    abort_pattern: Optional["re.Pattern"] = None
 ) -> Tuple[str, Optional[str]]:
     """
     Call Ollama /api/chat endpoint.
     Returns (response_text, error_message).
+    
+    With abort_pattern, the reply is streamed and generation is cut off as soon as
+    the pattern matches; the partial text (including the match) is returned.
     """
+    payload = {
+        "model": model,
+        "stream": abort_pattern is not None,
+        "messages": messages,
+        "keep_alive": RAG_KEEP_ALIVE,
+        "options": {
+            "temperature": temperature,
+            "num_ctx": RAG_NUM_CTX
+        }
+    }
     try:
-        resp = requests.post(
+        if abort_pattern is None:
+            resp = _OLLAMA_SESSION.post(
+                f"{OLLAMA_BASE_URL}/api/chat",
+                json=payload,
+                timeout=300
+            )
+            resp.raise_for_status()
+            data = resp.json()
+            return data["message"]["content"], None
+        
+        # Streamed: one JSON object per line; closing the response stops generation
+        with _OLLAMA_SESSION.post(
             f"{OLLAMA_BASE_URL}/api/chat",
-            json={
-                "model": model,
-                "stream": False,
-                "messages": messages,
-                "options": {
-                    "temperature": temperature,
-                    "num_ctx": RAG_NUM_CTX
-                }
-            },
-            timeout=300
-        )
-        resp.raise_for_status()
-        data = resp.json()
-        return data["message"]["content"], None
+            json=payload,
+            timeout=300,
+            stream=True
+        ) as resp:
+            resp.raise_for_status()
+            text = ""
+            for line in resp.iter_lines():
+                if not line:
+                    continue
+                data = json.loads(line)
+                if "error" in data:
+                    return "", data["error"]
+                # Only rescan the tail, wide enough for a match split across tokens
+                scan_from = max(0, len(text) - STREAM_ABORT_WINDOW)
+                text += data.get("message", {}).get("content", "")
+                if abort_pattern.search(text, scan_from):
+                    print("  ✂️  Stopped generation early: answer already fails validation")
+                    break
+                if data.get("done"):
+                    break
+            return text, None
     except requests.exceptions.ConnectionError:
         return "", "Cannot connect to Ollama. Is it running?"
     except requests.exceptions.Timeout:
@@ -888,47 +964,13 @@ def call_ollama(
 # ============================================================================
 # STRICT Fail-Fast Ask with Validation
 # ============================================================================
-def ask_with_strict_validation(
-    question: str,
-    context_chunks: List[Dict],
-    allowed_ids: Set[str],
-    model: str,
-    lenient_mode: bool = False
-) -> Tuple[str, Set[str]]:
-    """
-    Ask the question with context and STRICTLY validate citations + quotes.
-    
-    FAIL-FAST: Raises CitationValidationError if validation fails after retry.
-    No silent fallbacks, no warnings-only - either valid or exception.
-    
-    Args:
-        question: User's question
-        context_chunks: Retrieved context chunks
-        allowed_ids: Set of valid chunk IDs
-        model: Ollama model name
-        lenient_mode: If True, allow up to 50% uncited blocks (for teaching-style answers)
-    
-    Returns:
-        Tuple of (validated_answer, used_citations)
-    
-    Raises:
-        CitationValidationError: If answer fails validation after retry
-        RuntimeError: If Ollama returns an error
-    """
-    context_text = build_context_payload(context_chunks)
-    allowed_ids_str = ", ".join(sorted(allowed_ids))
-    
-    # Build the user prompt with quote requirement
-    user_prompt = f"""CONTEXT:
-{context_text}
-
-ALLOWED CHUNK IDS: {allowed_ids_str}
-
-CRITICAL RULES - YOU MUST FOLLOW EXACTLY:
-1. Use ONLY information from the CONTEXT above - never invent or create new examples
+# Question-independent part of the first prompt; kept byte-identical across
+# calls so Ollama can reuse its KV cache for it
+ANSWER_RULES = f"""CRITICAL RULES - YOU MUST FOLLOW EXACTLY:
+1. Use ONLY information from the CONTEXT below - never invent or create new examples
 2. ALWAYS provide evidence: either "quoted text" OR code blocks with ```
 3. IMMEDIATELY follow each piece of evidence with [chunk:<id>] citation
-4. ONLY use chunk IDs from the ALLOWED list above
+4. ONLY use chunk IDs from the ALLOWED CHUNK IDS list below
 5. If the context does NOT contain the answer, respond EXACTLY: {IDK}
 
 When user asks for "example", "dummy", or "template":
@@ -974,7 +1016,49 @@ PUT _index_template/my-template
   }}
 }}
 ```
-[chunk:abc123_0001]
+[chunk:abc123_0001]"""
+
+
+def ask_with_strict_validation(
+    question: str,
+    context_chunks: List[Dict],
+    allowed_ids: Set[str],
+    model: str,
+    lenient_mode: bool = False
+) -> Tuple[str, Set[str]]:
+    """
+    Ask the question with context and STRICTLY validate citations + quotes.
+    
+    FAIL-FAST: Raises CitationValidationError if validation fails after retry.
+    No silent fallbacks, no warnings-only - either valid or exception.
+    
+    Args:
+        question: User's question
+        context_chunks: Retrieved context chunks
+        allowed_ids: Set of valid chunk IDs
+        model: Ollama model name
+        lenient_mode: If True, allow up to 50% uncited blocks (for teaching-style answers)
+    
+    Returns:
+        Tuple of (validated_answer, used_citations)
+    
+    Raises:
+        CitationValidationError: If answer fails validation after retry
+        RuntimeError: If Ollama returns an error
+    """
+    context_text = build_context_payload(context_chunks)
+    # Sorted once; reused by both prompts and the debug bundle
+    sorted_ids = sorted(allowed_ids)
+    allowed_ids_str = ", ".join(sorted_ids)
+    
+    # Static rules first, then context and IDs, question last: consecutive
+    # questions share the longest possible prompt prefix in Ollama's cache
+    user_prompt = f"""{ANSWER_RULES}
+
+CONTEXT:
+{context_text}
+
+ALLOWED CHUNK IDS: {allowed_ids_str}
 
 QUESTION: {question}"""
 
@@ -985,13 +1069,15 @@ QUESTION: {question}"""
     # Prepare debug payload (will be filled on failure)
     debug_payload = {
         "model": model,
-        "allowed_ids": allowed_ids,
+        "allowed_ids": sorted_ids,
         "user_prompt": user_prompt,
         "question": question,
     }
     
     # ========== FIRST ATTEMPT (lenient - no quote requirement) ==========
-    answer, error = call_ollama(model, messages)
+    # Streamed so an external URL (always rejected) triggers the retry without
+    # waiting for the rest of the generation
+    answer, error = call_ollama(model, messages, abort_pattern=UNSUPPORTED_URL_PATTERN)
     if error:
         raise RuntimeError(f"Ollama error: {error}")
     
@@ -1002,9 +1088,7 @@ QUESTION: {question}"""
             require_quotes=False, lenient_mode=lenient_mode
         )
         # Check if evidence (quotes or code blocks) exists even without requirement
-        quotes_found = QUOTE_PATTERN.findall(answer)
-        code_blocks_found = CODE_BLOCK_PATTERN.findall(answer)
-        if quotes_found or code_blocks_found:
+        if has_evidence(answer):
             return answer, used_citations  # SUCCESS with evidence on first try
         else:
             # Has citations but no evidence - retry to get evidence
@@ -1088,6 +1172,11 @@ ANSWER WITH EVIDENCE (quotes or code) AND CITATIONS:"""
 # ============================================================================
 # Main interactive loop
 # ============================================================================
+def _normalize_question(question: str) -> str:
+    """Cache key for a question: case-insensitive, whitespace collapsed."""
+    return " ".join(question.casefold().split())
+
+
 def print_startup_banner(model: str, kb_stats: dict) -> None:
     """Print comprehensive startup diagnostics."""
     print("=" * 70)
@@ -1160,6 +1249,12 @@ def main():
     
     print("Type your question and press Enter. Type 'exit' or 'quit' to stop.\n")
     
+    # (question, retrieved context) -> validated (answer, citations), LRU order
+    answer_cache: "OrderedDict[tuple, Tuple[str, Set[str]]]" = OrderedDict()
+    # question -> (context_chunks, allowed_ids, diagnostics), LRU order; valid for one kb version
+    retrieval_cache: "OrderedDict[str, Tuple[List[Dict], Set[str], dict]]" = OrderedDict()
+    retrieval_cache_version = kb.kb_version()
+    
     while True:
         try:
             question = input("Question: ").strip()
@@ -1174,48 +1269,81 @@ def main():
             print("\n👋 Goodbye!")
             break
 
-        print("\n🔍 Searching knowledge base...")
-        context_chunks, allowed_ids, diagnostics = retrieve_context(kb, question)
+        # The watcher or MCP server may re-ingest while the session runs: drop
+        # cached retrievals as soon as the knowledge base version changes
+        kb_version = kb.kb_version()
+        if kb_version != retrieval_cache_version:
+            retrieval_cache.clear()
+            retrieval_cache_version = kb_version
+        
+        # Same question against the same kb version: skip the embedding and ANN query
+        question_key = _normalize_question(question)
+        retrieved = retrieval_cache.get(question_key)
+        if retrieved is not None:
+            retrieval_cache.move_to_end(question_key)
+            print("\n♻️  Same question as before - reusing retrieved context")
+        else:
+            print("\n🔍 Searching knowledge base...")
+            retrieved = retrieve_context(kb, question)
+            if RAG_RETRIEVAL_CACHE_SIZE > 0:
+                retrieval_cache[question_key] = retrieved
+                if len(retrieval_cache) > RAG_RETRIEVAL_CACHE_SIZE:
+                    retrieval_cache.popitem(last=False)
+        context_chunks, allowed_ids, diagnostics = retrieved
         
         if not context_chunks:
             print("⚠️  No relevant results found in knowledge base.\n")
             continue
 
-        # Show retrieval diagnostics
-        print(f"✓ Retrieved {diagnostics['fetched']} candidates → {diagnostics['final_count']} chunks")
-        if diagnostics.get('low_relevance_filtered', 0) > 0:
-            print(f"  🔍 Filtered {diagnostics['low_relevance_filtered']} low-relevance chunks (score < {RAG_MIN_SCORE})")
-        if diagnostics['toc_filtered'] > 0:
-            print(f"  📄 Filtered {diagnostics['toc_filtered']} TOC-like chunks:")
-            for toc_info in diagnostics['toc_reasons'][:3]:
-                print(f"      - {toc_info['id']}: {', '.join(toc_info['reasons'])}")
-                print(f"        Preview: \"{toc_info['preview'][:60]}...\"")
-        if diagnostics['expanded_chunks'] > 0:
-            print(f"  📖 Expanded {diagnostics['expanded_chunks']} adjacent PDF chunks")
-        
-        print(f"\n  Allowed chunk IDs ({len(allowed_ids)}):")
-        for cid in sorted(allowed_ids)[:8]:
-            print(f"    - {cid}")
-        if len(allowed_ids) > 8:
-            print(f"    ... and {len(allowed_ids) - 8} more")
-        
-        # Show sources with quality info
-        print("\n  📚 Sources:")
-        for chunk in context_chunks[:6]:
-            meta = chunk["metadata"]
-            source = meta.get("relative_path", meta.get("filename", "unknown"))
-            exp_marker = " [expanded]" if chunk.get("expanded") else ""
-            print(f"    • [{chunk['id']}] {source} (score: {chunk['score']:.2f}){exp_marker}")
-        if len(context_chunks) > 6:
-            print(f"    ... and {len(context_chunks) - 6} more chunks")
+        # Show retrieval diagnostics, collected and written in one go
+        out = [f"✓ Retrieved {diagnostics['fetched']} candidates → {diagnostics['final_count']} chunks"]
+        if RAG_VERBOSE:
+            if diagnostics.get('low_relevance_filtered', 0) > 0:
+                out.append(f"  🔍 Filtered {diagnostics['low_relevance_filtered']} low-relevance chunks (score < {RAG_MIN_SCORE})")
+            if diagnostics['toc_filtered'] > 0:
+                out.append(f"  📄 Filtered {diagnostics['toc_filtered']} TOC-like chunks:")
+                for toc_info in diagnostics['toc_reasons'][:3]:
+                    out.append(f"      - {toc_info['id']}: {', '.join(toc_info['reasons'])}")
+                    out.append(f"        Preview: \"{toc_info['preview'][:60]}...\"")
+            if diagnostics['expanded_chunks'] > 0:
+                out.append(f"  📖 Expanded {diagnostics['expanded_chunks']} adjacent PDF chunks")
+            
+            out.append(f"\n  Allowed chunk IDs ({len(allowed_ids)}):")
+            for cid in sorted(allowed_ids)[:8]:
+                out.append(f"    - {cid}")
+            if len(allowed_ids) > 8:
+                out.append(f"    ... and {len(allowed_ids) - 8} more")
+            
+            # Show sources with quality info
+            out.append("\n  📚 Sources:")
+            for chunk in context_chunks[:6]:
+                meta = chunk["metadata"]
+                source = meta.get("relative_path", meta.get("filename", "unknown"))
+                exp_marker = " [expanded]" if chunk.get("expanded") else ""
+                out.append(f"    • [{chunk['id']}] {source} (score: {chunk['score']:.2f}){exp_marker}")
+            if len(context_chunks) > 6:
+                out.append(f"    ... and {len(context_chunks) - 6} more chunks")
+        print("\n".join(out))
         
-        print(f"\n🤖 Asking {effective_model}...")
+        # Same question over the exact same chunks: the validated answer still holds
+        cache_key = (question_key, tuple((c["id"], c["text"]) for c in context_chunks))
+        cached = answer_cache.get(cache_key)
         
         try:
-            # STRICT validation - will raise exception if invalid
-            answer, used_citations = ask_with_strict_validation(
-                question, context_chunks, allowed_ids, effective_model
-            )
+            if cached is not None:
+                answer_cache.move_to_end(cache_key)
+                answer, used_citations = cached
+                print("\n♻️  Same question and context as before - reusing validated answer")
+            else:
+                print(f"\n🤖 Asking {effective_model}...")
+                # STRICT validation - will raise exception if invalid
+                answer, used_citations = ask_with_strict_validation(
+                    question, context_chunks, allowed_ids, effective_model
+                )
+                if RAG_ANSWER_CACHE_SIZE > 0:
+                    answer_cache[cache_key] = (answer, used_citations)
+                    if len(answer_cache) > RAG_ANSWER_CACHE_SIZE:
+                        answer_cache.popitem(last=False)
             
             # SUCCESS - answer is validated
             print("\n" + "=" * 70)
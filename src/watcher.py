@@ -4,8 +4,10 @@ Monitort de ./data directory en triggert automatische ingestion bij wijzigingen.
 """
 
 import sys
+import threading
 import time
 from pathlib import Path
+from typing import Set
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler, FileSystemEvent
 from ingestion import DocumentIngestion
@@ -22,6 +24,10 @@ class KnowledgeBaseEventHandler(FileSystemEventHandler):
         super().__init__()
         self.ingestion = ingestion
         self.supported_extensions = {'.md', '.txt', '.pdf'}
+        # Deleted files are collected and removed in one batch (see flush_deletions);
+        # the lock keeps the observer thread and the flush from writing at the same time
+        self.pending_deletions: Set[Path] = set()
+        self.lock = threading.Lock()
     
     def _is_supported_file(self, path: str) -> bool:
         """Check if file extension is supported."""
@@ -31,19 +37,33 @@ class KnowledgeBaseEventHandler(FileSystemEventHandler):
         """Triggered when a new file is created."""
         if not event.is_directory and self._is_supported_file(event.src_path):
             print(f"\n🆕 New file detected: {Path(event.src_path).name}")
-            self.ingestion.ingest_file(Path(event.src_path))
+            with self.lock:
+                self.pending_deletions.discard(Path(event.src_path))
+                self.ingestion.ingest_file(Path(event.src_path))
     
     def on_modified(self, event: FileSystemEvent):
         """Triggered when a file is modified."""
         if not event.is_directory and self._is_supported_file(event.src_path):
             print(f"\n✏️  File modified: {Path(event.src_path).name}")
-            self.ingestion.ingest_file(Path(event.src_path))
+            with self.lock:
+                self.pending_deletions.discard(Path(event.src_path))
+                self.ingestion.ingest_file(Path(event.src_path))
     
     def on_deleted(self, event: FileSystemEvent):
         """Triggered when a file is deleted."""
         if not event.is_directory and self._is_supported_file(event.src_path):
             print(f"\n🗑️  File deleted: {Path(event.src_path).name}")
-            self.ingestion.remove_file(Path(event.src_path))
+            with self.lock:
+                self.pending_deletions.add(Path(event.src_path))
+    
+    def flush_deletions(self):
+        """Remove all files deleted since the last flush with one remove_files call."""
+        with self.lock:
+            if not self.pending_deletions:
+                return
+            deleted = sorted(self.pending_deletions)
+            self.pending_deletions.clear()
+            self.ingestion.remove_files(deleted)
 
 
 class WatcherService:
@@ -83,6 +103,8 @@ class WatcherService:
         try:
             while True:
                 time.sleep(1)
+                # Deleting a folder fires one event per file: remove them as one batch
+                self.event_handler.flush_deletions()
         except KeyboardInterrupt:
             print("\n⏹️  Stopping watcher...", flush=True)
             self.stop()
@@ -91,6 +113,7 @@ class WatcherService:
         """Stop de watcher service."""
         self.observer.stop()
         self.observer.join()
+        self.event_handler.flush_deletions()
         print("✓ Watcher stopped")
 
 
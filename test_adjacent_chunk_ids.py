@@ -0,0 +1,45 @@
+"""
+Regression tests for get_adjacent_chunk_ids
+
+Adjacent IDs must use the unpadded {hash}_{index} format written by
+DocumentPreparer.iter_chunks, otherwise PDF chunk expansion never matches.
+"""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent / 'src'))
+
+from local_rag_ollama import get_adjacent_chunk_ids  # type: ignore
+
+
+def test_case(name: str, chunk_id: str, radius: int, expected: list) -> bool:
+    """Run a single test case."""
+    result = get_adjacent_chunk_ids(chunk_id, radius)
+    if result == expected:
+        print(f"✅ PASS - {name}: {chunk_id!r} -> {result}")
+        return True
+    print(f"❌ FAIL - {name}: {chunk_id!r} -> {result}, expected {expected}")
+    return False
+
+
+def main():
+    test_results = [
+        test_case("First chunk (no negative indices)", "abc_0", 2, ["abc_1", "abc_2"]),
+        test_case("Middle chunk", "abc_3", 2, ["abc_1", "abc_2", "abc_4", "abc_5"]),
+        test_case("Underscore in hash, multi-digit index", "a_b_10", 1, ["a_b_9", "a_b_11"]),
+        test_case("Malformed: no index", "abc", 2, []),
+        test_case("Malformed: non-numeric index", "abc_x", 2, []),
+        test_case("Malformed: empty index", "abc_", 2, []),
+        test_case("Malformed: non-ASCII digit", "abc_٣", 2, []),
+    ]
+
+    print(f"\nPassed: {sum(test_results)}/{len(test_results)}")
+    if all(test_results):
+        print("✅ ALL TESTS PASSED")
+    else:
+        print(f"❌ {len(test_results) - sum(test_results)} TEST(S) FAILED")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
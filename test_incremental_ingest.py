@@ -0,0 +1,125 @@
+"""
+Test incremental ingestion
+
+Re-ingesting an unchanged file must be skipped (no re-embedding), a file
+that shrinks must lose its chunks beyond the new chunk count, and a touched
+but unchanged file must be skipped unread on the run after.
+"""
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent / 'src'))
+
+from ingestion import DocumentIngestion  # type: ignore
+
+
+def make_text(paragraphs: int) -> str:
+    """Markdown text of roughly one chunk per paragraph."""
+    return "\n\n".join(
+        f"## Section {i}\n\n" + f"Paragraph {i} talks about incremental ingestion. " * 15
+        for i in range(paragraphs)
+    )
+
+
+def chunk_ids_for(ing: DocumentIngestion, file_path: Path) -> list:
+    """Stored chunk_id values for one file, sorted."""
+    res = ing.collection.get(
+        where={"relative_path": ing._doc_key(file_path)},
+        include=["metadatas"]
+    )
+    return sorted(meta["chunk_id"] for meta in res["metadatas"])
+
+
+def test_incremental_ingest() -> bool:
+    with tempfile.TemporaryDirectory(ignore_cleanup_errors=True) as tmp:
+        data_dir = Path(tmp) / "notes"
+        data_dir.mkdir()
+        note = data_dir / "note.md"
+        note.write_text(make_text(6), encoding="utf-8")
+
+        ing = DocumentIngestion(data_dir=str(data_dir), db_path=str(Path(tmp) / "db"))
+
+        # Count embed calls: a skipped file is never re-embedded
+        embed_calls = []
+        original_embed = ing.embed_documents
+
+        def counting_embed(documents):
+            embed_calls.append(len(documents))
+            return original_embed(documents)
+
+        ing.embed_documents = counting_embed
+
+        results = []
+
+        print("1. First ingest of note.md...")
+        ok = ing.ingest_file(note)
+        initial_ids = chunk_ids_for(ing, note)
+        print(f"   Stored chunk_ids: {initial_ids}")
+        results.append(ok and len(initial_ids) > 2 and initial_ids == list(range(len(initial_ids))))
+
+        print("\n2. Re-ingest unchanged note.md (should be skipped)...")
+        embed_calls.clear()
+        ok = ing.ingest_file(note)
+        skipped = ok and not embed_calls and chunk_ids_for(ing, note) == initial_ids
+        print(f"   {'✅' if skipped else '❌'} Skipped without re-embedding: {skipped}")
+        results.append(skipped)
+
+        print("\n3. Shrink note.md to a single chunk (stale chunks should be deleted)...")
+        note.write_text(make_text(1), encoding="utf-8")
+        ok = ing.ingest_file(note)
+        shrunk_ids = chunk_ids_for(ing, note)
+        print(f"   Stored chunk_ids: {shrunk_ids}")
+        shrunk = ok and shrunk_ids == list(range(len(shrunk_ids))) and len(shrunk_ids) < len(initial_ids)
+        print(f"   {'✅' if shrunk else '❌'} Higher chunk_ids removed: {shrunk}")
+        results.append(shrunk)
+
+        print("\n4. Grow, then shrink again through ingest_directory...")
+        note.write_text(make_text(6), encoding="utf-8")
+        ing.ingest_directory(workers=1)
+        grown_ids = chunk_ids_for(ing, note)
+        note.write_text(make_text(2), encoding="utf-8")
+        ing.ingest_directory(workers=1)
+        batch_ids = chunk_ids_for(ing, note)
+        print(f"   Stored chunk_ids: {grown_ids} -> {batch_ids}")
+        batch_ok = batch_ids == list(range(len(batch_ids))) and len(batch_ids) < len(grown_ids)
+        print(f"   {'✅' if batch_ok else '❌'} Batch ingest removed stale chunks: {batch_ok}")
+        results.append(batch_ok)
+
+        print("\n5. Re-run ingest_directory on the unchanged tree (should be skipped)...")
+        embed_calls.clear()
+        ing.ingest_directory(workers=1)
+        dir_skipped = not embed_calls and chunk_ids_for(ing, note) == batch_ids
+        print(f"   {'✅' if dir_skipped else '❌'} Skipped without re-embedding: {dir_skipped}")
+        results.append(dir_skipped)
+
+        print("\n6. Touch note.md without changing it (file_sig should be refreshed)...")
+        stat = note.stat()
+        os.utime(note, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+        ing.ingest_directory(workers=1)
+        prepare_calls = []
+        original_prepare = ing.prepare_file
+
+        def counting_prepare(file_path):
+            prepare_calls.append(file_path)
+            return original_prepare(file_path)
+
+        ing.prepare_file = counting_prepare
+        ing.ingest_directory(workers=1)
+        sig_refreshed = not prepare_calls
+        print(f"   {'✅' if sig_refreshed else '❌'} Next run skipped the file unread: {sig_refreshed}")
+        results.append(sig_refreshed)
+
+        return all(results)
+
+
+if __name__ == "__main__":
+    print("=" * 70)
+    print("INCREMENTAL INGEST TEST")
+    print("=" * 70)
+    if test_incremental_ingest():
+        print("\n✅ ALL TESTS PASSED")
+    else:
+        print("\n❌ TEST FAILED")
+        sys.exit(1)